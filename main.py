@@ -1,25 +1,38 @@
 import os
+import hmac
+import time
+import hashlib
+import orjson
+from datetime import datetime
+from typing import Optional, List, AsyncIterator
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request, Security, Depends
+from fastapi import FastAPI, HTTPException, Request, Response, Security, Depends
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.security.api_key import APIKeyHeader
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
-from recommender import RecipeRecommender
-from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from recommender import RecipeRecommender, recipe_cache_key
 
 load_dotenv()
 
 RECIPE_API_KEY = os.getenv("RECIPE_API_KEY")
 if not RECIPE_API_KEY:
     raise Exception("RECIPE_API_KEY not found in environment variables")
+_RECIPE_API_KEY_BYTES = RECIPE_API_KEY.encode()
+
+# Browser origins allowed to call the API (comma-separated)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "https://biarkamimasak.vercel.app").split(",")
+    if origin.strip()
+]
 
 # API Key security scheme
 api_key_header = APIKeyHeader(name="X-Recipe-API-Key", auto_error=True)
 
 async def get_api_key(api_key_header: str = Security(api_key_header)):
-    if api_key_header == RECIPE_API_KEY:
+    # Constant-time comparison so response timing does not leak the key
+    if hmac.compare_digest(api_key_header.encode(), _RECIPE_API_KEY_BYTES):
         return api_key_header
     raise HTTPException(
         status_code=403,
@@ -30,22 +43,115 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
 app = FastAPI(
     title="Biar Kami Masak API",
     description="API untuk dapatkan cadangan resepi masakan dengan LLM",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=False,
+    allow_methods=["GET", "POST"],
+    allow_headers=["X-Recipe-API-Key", "Content-Type"],
 )
 
 
-try:
-    recommender = RecipeRecommender()
-except ValueError as e:
-    print(f"Error initializing RecipeRecommender: {e}")
+app.state.recommender = None
+
+
+# Built at startup rather than import time so importing the app stays fast
+@app.on_event("startup")
+def load_recommender():
+    try:
+        app.state.recommender = RecipeRecommender()
+    except ValueError as e:
+        print(f"Error initializing RecipeRecommender: {e}")
+
+
+@app.on_event("shutdown")
+async def close_recommender():
+    if app.state.recommender is not None:
+        await app.state.recommender.aclose()
+
+
+# Recipes for a given request are stable, so let clients and proxies reuse them
+RECIPE_CACHE_MAX_AGE = int(os.getenv("RECIPE_CACHE_MAX_AGE", "86400"))
+
+
+def recipe_cache_headers(key: tuple) -> dict:
+    """
+    Build the ETag/Cache-Control headers for a normalized recipe request key.
+
+    Uses the same key as the recommender's LRU cache so both caches agree.
+    The ETag is weak because it identifies the request, not the exact bytes:
+    the timestamp, and the recipe itself on a cache miss, may differ.
+    Responses require an API key, so shared caches must key on it.
+    """
+    etag = 'W/"' + hashlib.blake2b(orjson.dumps(key), digest_size=16).hexdigest() + '"'
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={RECIPE_CACHE_MAX_AGE}",
+        "Vary": "X-Recipe-API-Key",
+    }
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Check whether the request's If-None-Match header matches the given ETag,
+    using weak comparison.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return opaque in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+# Streaming chunk coalescing: start small for a fast first paint, then grow
+DEFAULT_MIN_BATCH_SIZE = 16        # characters in the first flushed chunk
+DEFAULT_MAX_BATCH_SIZE = 256       # upper bound on characters per chunk
+DEFAULT_BATCH_SIZE_GROWTH_FACTOR = 2
+DEFAULT_MAX_BATCH_DELAY = 0.02     # seconds a token may wait in the buffer
+
+
+async def coalesce_tokens(
+    tokens: AsyncIterator[str],
+    min_batch_size: int = DEFAULT_MIN_BATCH_SIZE,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    growth_factor: int = DEFAULT_BATCH_SIZE_GROWTH_FACTOR,
+    max_delay: float = DEFAULT_MAX_BATCH_DELAY,
+) -> AsyncIterator[str]:
+    """
+    Buffer streamed tokens and yield them as larger chunks.
+
+    A chunk is flushed once it reaches the current batch size or more than
+    max_delay seconds have passed since the previous flush. The batch size grows by
+    growth_factor after every flush, up to max_batch_size.
+    """
+    buf = []
+    buf_len = 0
+    batch_size = min_batch_size
+    last = time.monotonic()
+    try:
+        async for token in tokens:
+            buf.append(token)
+            buf_len += len(token)
+            now = time.monotonic()
+            if buf_len >= batch_size or now - last > max_delay:
+                yield "".join(buf)
+                buf.clear()
+                buf_len = 0
+                batch_size = min(batch_size * growth_factor, max_batch_size)
+                last = now
+    except Exception:
+        # Deliver what was already generated before surfacing the error
+        if buf:
+            yield "".join(buf)
+        raise
+    if buf:
+        yield "".join(buf)
     
     
 class SimpleQuery(BaseModel):
@@ -102,33 +208,48 @@ class RecipeResponse(BaseModel):
         }
     
     
+# Static response bodies, serialized once at import
+_ROOT_BODY = {
+    "message": "Selamat datang ke 'Biar Kami Masak API'!",
+    "version": "1.0.0",
+}
+_ROOT_NO_CLIENT = orjson.dumps({**_ROOT_BODY, "client_host": None})
+_ROOT_PREFIX = orjson.dumps(_ROOT_BODY)[:-1] + b',"client_host":'
+_HEALTH = orjson.dumps({"status": "healthy"})
+
+
 # Root endpoint
 @app.get('/')
 def root(request: Request):
-    client_host = request.client.host if request.client else None
-    return {
-        "message": "Selamat datang ke 'Biar Kami Masak API'!",
-        "version": "1.0.0",
-        "client_host": client_host
-    }
+    if not request.client:
+        return Response(content=_ROOT_NO_CLIENT, media_type="application/json")
+    body = _ROOT_PREFIX + orjson.dumps(request.client.host) + b"}"
+    return Response(content=body, media_type="application/json")
 
 # Health check endpoint
 @app.get("/health", dependencies=[Depends(get_api_key)])
 async def health_check():
-    return {"status": "healthy"}
+    return Response(content=_HEALTH, media_type="application/json")
 
 # Simple query endpoint
 @app.post("/v1/recipe/simple", response_model=RecipeResponse)
 async def get_recipe_simple(
     query: SimpleQuery,
-    api_key: str = Security(api_key_header)
+    request: Request,
+    api_key: str = Depends(get_api_key)
 ):
+    headers = recipe_cache_headers(recipe_cache_key("simple", query.ingredients, query.servings))
+    # If-None-Match on a POST fails with 412, not 304 (RFC 9110 13.1.2)
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=412, headers=headers)
+
     try:
-        recipe_data = recommender.get_recipe(
+        recipe_data = await request.app.state.recommender.aget_recipe(
             ingredients=query.ingredients,
             servings=query.servings
         )
-        return RecipeResponse(**recipe_data)
+        # Already-parsed dict; skip response_model re-validation and encoding
+        return ORJSONResponse(recipe_data, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -136,17 +257,30 @@ async def get_recipe_simple(
 @app.post("/v1/recipe/detailed", response_model=RecipeResponse)
 async def get_recipe_detailed(
     query: DetailedQuery,
-    api_key: str = Security(api_key_header)
+    request: Request,
+    api_key: str = Depends(get_api_key)
 ):
+    headers = recipe_cache_headers(recipe_cache_key(
+        "detailed",
+        query.ingredients,
+        query.servings,
+        query.dietary_restrictions,
+        query.cuisine_preference,
+        query.cooking_time
+    ))
+    # If-None-Match on a POST fails with 412, not 304 (RFC 9110 13.1.2)
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=412, headers=headers)
+
     try:
-        recipe_data = recommender.get_recipe_with_parameters(
+        recipe_data = await request.app.state.recommender.aget_recipe_with_parameters(
             ingredients=query.ingredients,
             servings=query.servings,
             dietary_restrictions=query.dietary_restrictions,
             cuisine_preference=query.cuisine_preference,
             cooking_time=query.cooking_time
         )
-        return RecipeResponse(**recipe_data)
+        return ORJSONResponse(recipe_data, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -154,15 +288,16 @@ async def get_recipe_detailed(
 @app.post("/v1/recipe/simple/stream")
 async def get_recipe_simple_stream(
     query: SimpleQuery,
-    api_key: str = Security(api_key_header)
+    request: Request,
+    api_key: str = Depends(get_api_key)
 ):
     async def generate():
         try:
-            async for token in recommender.get_recipe_stream(
+            async for chunk in coalesce_tokens(request.app.state.recommender.get_recipe_stream(
                 ingredients=query.ingredients,
                 servings=query.servings
-            ):
-                yield token
+            )):
+                yield chunk
         except Exception as e:
             yield f"Error: {str(e)}"
 
@@ -174,18 +309,19 @@ async def get_recipe_simple_stream(
 @app.post("/v1/recipe/detailed/stream")
 async def get_recipe_detailed_stream(
     query: DetailedQuery,
-    api_key: str = Security(api_key_header)
+    request: Request,
+    api_key: str = Depends(get_api_key)
 ):
     async def generate():
         try:
-            async for token in recommender.get_recipe_with_parameters_stream(
+            async for chunk in coalesce_tokens(request.app.state.recommender.get_recipe_with_parameters_stream(
                 ingredients=query.ingredients,
                 servings=query.servings,
                 dietary_restrictions=query.dietary_restrictions,
                 cuisine_preference=query.cuisine_preference,
                 cooking_time=query.cooking_time
-            ):
-                yield token
+            )):
+                yield chunk
         except Exception as e:
             yield f"Error: {str(e)}"
 
@@ -197,7 +333,8 @@ async def get_recipe_detailed_stream(
 # Error handling
 @app.exception_handler(HTTPException)
 async def generic_exception_handler(request, exc):
-    return {
-        "status": "error",
-        "message": str(exc)
-    }
\ No newline at end of file
+    return ORJSONResponse(
+        {"status": "error", "message": str(exc)},
+        status_code=exc.status_code,
+        headers=exc.headers,
+    )
\ No newline at end of file
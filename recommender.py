@@ -1,20 +1,179 @@
 import os
-import re
+import time
 import asyncio
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
-from langchain.callbacks import AsyncIteratorCallbackHandler
-from langchain.schema import HumanMessage
+import orjson
+from collections import OrderedDict
 from dotenv import load_dotenv
 from typing import Optional, List, AsyncIterator
-from datetime import datetime
+
+# Kept short: they are sent with every request, so their length adds directly
+# to time-to-first-token
+_PERSONA = "You are a goofy, friendly and helpful chef. Suggest one recipe using the user's ingredients (basic extras allowed), respecting any dietary restrictions, cuisine preference and time limit given. Reply in the user's language (Malay/English) and put jokes in the notes."
+
+# Structured endpoints run in JSON mode
+SYSTEM_PROMPT = _PERSONA + """
+Return ONLY a JSON object with keys: title (string), ingredients (array of strings with quantities), instructions (array of step strings), cooking_time (string, in minutes), difficulty (Easy/Medium/Hard), notes (string of tips, substitutions, jokes)."""
+
+# Streaming endpoints send readable text straight to the client
+STREAM_SYSTEM_PROMPT = _PERSONA + """
+Use EXACTLY this format:
+TITLE: <name>
+INGREDIENTS:
+- <ingredient with quantity>
+INSTRUCTIONS:
+1. <step>
+COOKING TIME: <time in minutes>
+DIFFICULTY: <Easy/Medium/Hard>
+NOTES: <tips, substitutions, jokes>"""
+
+SIMPLE_USER_PROMPT = "Main Ingredients Available: {ingredients}\nServings: {servings}"
+
+# Fallbacks for keys the model leaves out or empty
+_RECIPE_DEFAULTS = {
+    'title': "",
+    'ingredients': [],
+    'instructions': [],
+    'cooking_time': "Not specified",
+    'difficulty': "Not specified",
+    'notes': "No additional notes.",
+}
+
+
+_timestamp_cache = (0, "")
+
+
+def utc_timestamp() -> str:
+    """
+    Current UTC time as an ISO-8601 string with second resolution.
+
+    The string is only re-formatted when the wall-clock second changes.
+    """
+    global _timestamp_cache
+    now = int(time.time())
+    if now != _timestamp_cache[0]:
+        _timestamp_cache = (now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now)))
+    return _timestamp_cache[1]
+
+
+def recipe_cache_key(chain_name: str,
+                     ingredients: List[str],
+                     servings: Optional[int] = 2,
+                     dietary_restrictions: Optional[list] = None,
+                     cuisine_preference: Optional[str] = None,
+                     cooking_time: Optional[int] = None) -> tuple:
+    """
+    Build a normalized, hashable key identifying a recipe request.
+
+    Ingredient order, casing and surrounding whitespace do not change the key,
+    so equivalent requests share the same cached recipe.
+    """
+    return (
+        chain_name,
+        tuple(sorted(s.strip().lower() for s in ingredients)),
+        servings or 2,
+        tuple(sorted(s.strip().lower() for s in dietary_restrictions or [])),
+        (cuisine_preference or "").strip().lower(),
+        cooking_time,
+    )
+
+
+# Micro-batching of concurrent async LLM calls
+MAX_BATCH = int(os.getenv("RECIPE_MAX_BATCH", "8"))
+MAX_LATENCY = float(os.getenv("RECIPE_MAX_LATENCY_MS", "20")) / 1000
+
+
+class RequestBatcher:
+    """
+    Coalesce concurrent LLM calls into batches dispatched with llm.abatch.
+
+    Submitted prompts are collected for up to max_latency seconds or until
+    max_batch prompts are pending, then sent together so they share the
+    pooled connections to the OpenAI endpoint.
+    """
+    def __init__(self, llm, max_batch: int = MAX_BATCH, max_latency: float = MAX_LATENCY):
+        self.llm = llm
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._queue = None
+        self._worker = None
+        self._pending = set()
+
+    async def submit(self, prompt):
+        """
+        Queue a prompt and wait for its LLM response.
+        """
+        # Started lazily so the worker runs on the serving event loop
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((prompt, future))
+        return await future
+
+    async def aclose(self):
+        """
+        Stop collecting batches and wait for in-flight dispatches to finish.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+            # Prompts still queued will never be dispatched
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
+
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispatch in the background so the next batch can start filling
+            task = asyncio.create_task(self._dispatch(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            results = await self.llm.abatch([prompt for prompt, _ in batch], return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
 
 class RecipeRecommender:
     def __init__(self, 
                  api_key: Optional[str] = None,
                  model: str = "gpt-4o-mini",
                  temperature: float = 0.7,
-                 max_tokens: int = 1000):
+                 max_tokens: int = 1000,
+                 cache_size: int = 1024,
+                 max_batch: int = MAX_BATCH,
+                 max_batch_latency: float = MAX_LATENCY):
         """
         Initialize the RecipeRecommender with custom settings.
         
@@ -24,7 +183,15 @@ class RecipeRecommender:
             base_url (str): Base URL for the API
             temperature (float): Temperature setting for response generation
             max_tokens (int): Maximum tokens in the response
+            cache_size (int): Maximum number of parsed recipes kept in the LRU cache
+            max_batch (int): Maximum number of async LLM calls sent in one batch
+            max_batch_latency (float): Seconds to wait for a batch to fill
         """
+        # Imported here so loading this module (and each server worker) stays cheap
+        import httpx
+        from langchain_openai import ChatOpenAI
+        from langchain_core.prompts import ChatPromptTemplate
+
         # Load environment variables if no API key provided
         if api_key is None:
             load_dotenv()
@@ -32,184 +199,181 @@ class RecipeRecommender:
             if api_key is None:
                 raise ValueError("No API key provided and none found in environment variables")
 
+        # Pooled HTTP/2 clients shared by both models so requests to the
+        # OpenAI endpoint multiplex over kept-alive connections. The request
+        # timeout is set on ChatOpenAI, which overrides the client's own
+        # timeout on every call
+        limits = httpx.Limits(max_keepalive_connections=50, max_connections=200)
+        self._http = httpx.Client(http2=True, timeout=30, limits=limits)
+        self._http_async = httpx.AsyncClient(http2=True, timeout=30, limits=limits)
+
         # Initialize the language model
         self.llm = ChatOpenAI(
             model=model,
             api_key=api_key,
             temperature=temperature,
             max_tokens=max_tokens,
+            model_kwargs={"response_format": {"type": "json_object"}},
+            timeout=30,
+            http_client=self._http,
+            http_async_client=self._http_async,
         )
 
-        # Define the recipe prompt template
-        self.recipe_prompt = PromptTemplate(
-            input_variables=["ingredients", "servings"],
-            template="""You are a goofy chef and recipe recommender. You are very friendly, funny and helpful. 
-            Given the following information:
-
-            Main Ingredients Available: {ingredients}
-            Servings: {servings}
-
-            Please provide a recipe that uses these ingredients (you can suggest additional basic ingredients).
-            Format your response EXACTLY as follows:
-
-            TITLE: [Recipe Name]
-
-            INGREDIENTS:
-            - [ingredient 1 with quantity]
-            - [ingredient 2 with quantity]
-            ...
-
-            INSTRUCTIONS:
-            1. [First step]
-            2. [Second step]
-            ...
-
-            COOKING TIME: [time in minutes]
+        # Streaming variant, shared by all streaming requests
+        self.streaming_llm = ChatOpenAI(
+            model=model,
+            api_key=api_key,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            streaming=True,
+            timeout=30,
+            http_client=self._http,
+            http_async_client=self._http_async,
+        )
 
-            DIFFICULTY: [Easy/Medium/Hard]
+        # Shared system prompt plus a short user message per request type
+        self.recipe_prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("user", SIMPLE_USER_PROMPT),
+        ])
+        self.recipe_detailed_prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("user", "{context}"),
+        ])
+        self.recipe_stream_prompt = ChatPromptTemplate.from_messages([
+            ("system", STREAM_SYSTEM_PROMPT),
+            ("user", SIMPLE_USER_PROMPT),
+        ])
+        self.recipe_detailed_stream_prompt = ChatPromptTemplate.from_messages([
+            ("system", STREAM_SYSTEM_PROMPT),
+            ("user", "{context}"),
+        ])
+
+        # Create the recipe chains
+        self.recipe_chain = self.recipe_prompt | self.llm
+        self.recipe_detailed_chain = self.recipe_detailed_prompt | self.llm
+        self.recipe_stream_chain = self.recipe_stream_prompt | self.streaming_llm
+        self.recipe_detailed_stream_chain = self.recipe_detailed_stream_prompt | self.streaming_llm
 
-            NOTES: [Add any helpful tips, substitutions, or humorous notes]
+        # Async structured requests are micro-batched
+        self._batcher = RequestBatcher(self.llm, max_batch, max_batch_latency)
 
-            Remember to be funny and engaging, but follow this EXACT format. Make some jokes in the notes section.
-            Also reply with user's input language (Malay/English)."""
-        )
-        
-        self.recipe_detailed_prompt = PromptTemplate(
-            input_variables=["context"],
-            template="""You are a goofy chef and recipe recommender. You are very friendly, funny and helpful. 
-            Given the following information:
+        # LRU cache of parsed recipes, keyed by recipe_cache_key()
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
 
-            {context}
+    async def aclose(self):
+        """
+        Stop the request batcher, then close the pooled HTTP connections to
+        the OpenAI endpoint.
+        """
+        await self._batcher.aclose()
+        self._http.close()
+        await self._http_async.aclose()
 
-            Please provide a recipe that:
-            1. Uses the provided ingredients (additional basic ingredients can be suggested)
-            2. Respects all dietary restrictions
-            3. Matches the cuisine preference if specified
-            4. Can be prepared within the time limit if specified
+    def _cache_get(self, key: tuple) -> Optional[dict]:
+        """
+        Return a copy of the cached recipe for the key, or None on a miss.
 
-            Format your response EXACTLY as follows:
+        A copy is returned so callers can add per-response fields
+        (e.g. timestamp) without touching the cache.
+        """
+        recipe_data = self._cache.get(key)
+        if recipe_data is None:
+            return None
+        self._cache.move_to_end(key)
+        return dict(recipe_data)
 
-            TITLE: [Recipe Name]
+    def _cache_put(self, key: tuple, recipe_data: dict) -> dict:
+        """
+        Store a parsed recipe, evicting the least recently used entry if full.
 
-            INGREDIENTS:
-            - [ingredient 1 with quantity]
-            - [ingredient 2 with quantity]
-            ...
+        Replies that parsed to no ingredients or instructions (e.g. truncated
+        JSON) are returned but not cached, so the next request retries.
+        """
+        if not (recipe_data['ingredients'] or recipe_data['instructions']):
+            return dict(recipe_data)
 
-            INSTRUCTIONS:
-            1. [First step]
-            2. [Second step]
-            ...
+        self._cache[key] = recipe_data
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return dict(recipe_data)
 
-            COOKING TIME: [time in minutes]
+    def _cached_invoke(self, key: tuple, chain, payload: dict) -> dict:
+        """
+        Invoke the given chain unless a parsed recipe for the key is cached.
+        """
+        recipe_data = self._cache_get(key)
+        if recipe_data is not None:
+            return recipe_data
 
-            DIFFICULTY: [Easy/Medium/Hard]
+        response = chain.invoke(payload)
+        return self._cache_put(key, self.extract_recipe_parts(response.content))
 
-            NOTES: [Add any helpful tips, substitutions, or humorous notes]
+    async def _acached_invoke(self, key: tuple, prompt, payload: dict) -> dict:
+        """
+        Async variant of _cached_invoke; the formatted prompt is sent through
+        the request batcher so the event loop is never blocked.
+        """
+        recipe_data = self._cache_get(key)
+        if recipe_data is not None:
+            return recipe_data
 
-            Remember to be funny and engaging, but follow this EXACT format. Make some jokes in the notes section.
-            Also reply with user's input language (Malay/English).
-            """
-        )
+        response = await self._batcher.submit(prompt.invoke(payload))
+        return self._cache_put(key, self.extract_recipe_parts(response.content))
 
-        # Create the recipe chain
-        self.recipe_chain = self.recipe_prompt | self.llm
-        self.recipe_detailed_chain = self.recipe_detailed_prompt | self.llm
-        
         # To extract title and main content    
-    def extract_recipe_parts(self, recipe_text: str) -> dict:
+    def extract_recipe_parts(self, recipe_json: str) -> dict:
         """
-        Extract and structure recipe components from the LLM output.
+        Extract recipe components from the LLM's JSON output.
     
         Args:
-            recipe_text (str): Complete recipe text from LLM
+            recipe_json (str): JSON object returned by the LLM in JSON mode
     
         Returns:
             dict: Structured recipe data
         """
-        # Remove markdown formatting
-        recipe_text = recipe_text.replace('*', '').replace('#', '')
-    
-        # Initialize components
-        title = ""
-        ingredients = []
-        instructions = []
-        cooking_time = ""
-        difficulty = ""
-        notes = ""
-    
-        # Split into sections
-        current_section = None
-        lines = recipe_text.strip().split('\n')
-    
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Extract title
-            if 'TITLE:' in line.upper():
-                title = re.sub(r'^TITLE:\s*', '', line, flags=re.IGNORECASE)
-                continue
-            
-            # Identify sections
-            if 'INGREDIENTS:' in line.upper():
-                current_section = 'ingredients'
-                continue
-            elif 'INSTRUCTIONS:' in line.upper():
-                current_section = 'instructions'
-                continue
-            elif 'COOKING TIME:' in line.upper():
-                cooking_time = re.sub(r'^COOKING TIME:\s*', '', line, flags=re.IGNORECASE)
-                continue
-            elif 'DIFFICULTY:' in line.upper():
-                difficulty = re.sub(r'^DIFFICULTY:\s*', '', line, flags=re.IGNORECASE)
-                continue
-            elif 'NOTES:' in line.upper():
-                current_section = 'notes'
-                notes = re.sub(r'^NOTES:\s*', '', line, flags=re.IGNORECASE)
-                continue
-            
-            # Process line based on current section
-            if current_section == 'ingredients' and line.strip():
-                if line.startswith('-'):
-                    ingredients.append(line.replace('-', '').strip())
-                elif line.strip() and not any(section in line.upper() for section in ['TITLE:', 'INSTRUCTIONS:', 'COOKING TIME:', 'DIFFICULTY:', 'NOTES:']):
-                    ingredients.append(line.strip())
-                
-            elif current_section == 'instructions':
-                # Remove numbering and clean up
-                if line.strip():
-                    # Check if line starts with a number followed by a dot
-                    match = re.match(r'^\d+\.\s*(.+)$', line)
-                    if match:
-                        instructions.append(match.group(1).strip())
-                    elif not any(section in line.upper() for section in ['TITLE:', 'INGREDIENTS:', 'COOKING TIME:', 'DIFFICULTY:', 'NOTES:']):
-                        instructions.append(line.strip())
-                    
-            elif current_section == 'notes' and line.strip():
-                if notes:
-                    notes += " " + line.strip()
-                else:
-                    notes = line.strip()
-
-        # Set default values if sections are empty
-        if not notes:
-            notes = "No additional notes."
-        if not difficulty:
-            difficulty = "Not specified"
-        if not cooking_time:
-            cooking_time = "Not specified"
-
-        return {
-            'title': title,
-            'ingredients': ingredients,
-            'instructions': instructions,
-            'cooking_time': cooking_time,
-            'difficulty': difficulty,
-            'notes': notes
-        }
+        # JSON mode does not enforce a schema, and output cut off at
+        # max_tokens is not valid JSON; fall back to defaults rather than fail
+        try:
+            data = orjson.loads(recipe_json)
+        except orjson.JSONDecodeError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+
+        recipe_data = {}
+        for key, default in _RECIPE_DEFAULTS.items():
+            value = data.get(key)
+            if isinstance(default, list):
+                items = value if isinstance(value, list) else []
+                recipe_data[key] = [str(item) for item in items if item] or list(default)
+            else:
+                recipe_data[key] = str(value) if value else default
+        return recipe_data
     
+    def _build_context(self,
+                       ingredients: List[str],
+                       servings: Optional[int] = 2,
+                       dietary_restrictions: Optional[list] = None,
+                       cuisine_preference: Optional[str] = None,
+                       cooking_time: Optional[int] = None) -> str:
+        """
+        Build the context for the detailed recipe prompt as compact JSON.
+
+        Optional parameters are left out when unset; the model treats a
+        missing key as "no preference".
+        """
+        context = {"ingredients": ingredients, "servings": servings or 2}
+        if dietary_restrictions:
+            context["dietary_restrictions"] = dietary_restrictions
+        if cuisine_preference:
+            context["cuisine"] = cuisine_preference
+        if cooking_time:
+            context["max_cooking_time_minutes"] = cooking_time
+
+        return orjson.dumps(context).decode()
+
     # Simple recipe
     def get_recipe(self, ingredients: List[str], servings: int = 2) -> dict:
         """
@@ -223,14 +387,14 @@ class RecipeRecommender:
             dict: Structured recipe data
         """
         ingredients_str = ", ".join(ingredients)
-    
-        response = self.recipe_chain.invoke({
+        servings = servings or 2
+        key = recipe_cache_key("simple", ingredients, servings)
+
+        recipe_data = self._cached_invoke(key, self.recipe_chain, {
             "ingredients": ingredients_str,
             "servings": servings
         })
-    
-        recipe_data = self.extract_recipe_parts(response.content)
-        recipe_data['timestamp'] = datetime.now()
+        recipe_data['timestamp'] = utc_timestamp()
         return recipe_data
     
     # Detailed recipe
@@ -243,58 +407,62 @@ class RecipeRecommender:
         """
         Get a structured recipe recommendation based on the provided parameters.
         """
-        ingredients_str = ", ".join(ingredients)
+        full_context = self._build_context(ingredients, servings, dietary_restrictions,
+                                           cuisine_preference, cooking_time)
+        key = recipe_cache_key("detailed", ingredients, servings,
+                               dietary_restrictions, cuisine_preference, cooking_time)
 
-        # Build the context
-        context_parts = [
-            f"Main Ingredients Available: {ingredients_str}",
-            f"Servings: {servings or 2}"
-        ]
+        recipe_data = self._cached_invoke(key, self.recipe_detailed_chain, {"context": full_context})
+        recipe_data['timestamp'] = utc_timestamp()
+        return recipe_data
 
-        if dietary_restrictions:
-            context_parts.append(f"Dietary Restrictions: {', '.join(dietary_restrictions)}")
-        if cuisine_preference:
-            context_parts.append(f"Cuisine Preference: {cuisine_preference}")
-        if cooking_time:
-            context_parts.append(f"Maximum Cooking Time: {cooking_time} minutes")
+    async def aget_recipe(self, ingredients: List[str], servings: int = 2) -> dict:
+        """
+        Async version of get_recipe, safe to await from request handlers.
+        """
+        servings = servings or 2
+        key = recipe_cache_key("simple", ingredients, servings)
 
-        full_context = "\n".join(context_parts)
+        recipe_data = await self._acached_invoke(key, self.recipe_prompt, {
+            "ingredients": ", ".join(ingredients),
+            "servings": servings
+        })
+        recipe_data['timestamp'] = utc_timestamp()
+        return recipe_data
+
+    async def aget_recipe_with_parameters(self,
+                                          ingredients: List[str],
+                                          servings: Optional[int] = 2,
+                                          dietary_restrictions: Optional[list] = None,
+                                          cuisine_preference: Optional[str] = None,
+                                          cooking_time: Optional[int] = None) -> dict:
+        """
+        Async version of get_recipe_with_parameters, safe to await from request handlers.
+        """
+        full_context = self._build_context(ingredients, servings, dietary_restrictions,
+                                           cuisine_preference, cooking_time)
+        key = recipe_cache_key("detailed", ingredients, servings,
+                               dietary_restrictions, cuisine_preference, cooking_time)
 
-        response = self.recipe_detailed_chain.invoke({"context": full_context})
-        recipe_data = self.extract_recipe_parts(response.content)
-        recipe_data['timestamp'] = datetime.now()
+        recipe_data = await self._acached_invoke(key, self.recipe_detailed_prompt, {"context": full_context})
+        recipe_data['timestamp'] = utc_timestamp()
         return recipe_data
     
     async def get_recipe_stream(self, ingredients: List[str], servings: int = 2) -> AsyncIterator[str]:
         """
         Get a streaming recipe recommendation based on the provided ingredients.
         """
-        callback = AsyncIteratorCallbackHandler()
-        llm = ChatOpenAI(
-            streaming=True,
-            callbacks=[callback],
-            model=self.llm.model_name,
-            temperature=self.llm.temperature,
-            max_tokens=self.llm.max_tokens,
-        )
-
-        prompt = self.recipe_prompt.format(
-            ingredients=", ".join(ingredients),
-            servings=servings
-        )
-
-        task = asyncio.create_task(
-            llm.agenerate([[HumanMessage(content=prompt)]])
-        )
+        payload = {
+            "ingredients": ", ".join(ingredients),
+            "servings": servings or 2
+        }
 
         try:
-            async for token in callback.aiter():
-                yield token
+            async for chunk in self.recipe_stream_chain.astream(payload):
+                yield chunk.content
         except Exception as e:
             print(f"Streaming error: {e}")
             raise
-        finally:
-            callback.done.set()
 
     async def get_recipe_with_parameters_stream(
         self,
@@ -307,40 +475,12 @@ class RecipeRecommender:
         """
         Get a streaming recipe recommendation with detailed parameters.
         """
-        callback = AsyncIteratorCallbackHandler()
-        llm = ChatOpenAI(
-            streaming=True,
-            callbacks=[callback],
-            model=self.llm.model_name,
-            temperature=self.llm.temperature,
-            max_tokens=self.llm.max_tokens,
-        )
-
-        # Build the context
-        context_parts = [
-            f"Main Ingredients Available: {', '.join(ingredients)}",
-            f"Servings: {servings or 2}"
-        ]
-
-        if dietary_restrictions:
-            context_parts.append(f"Dietary Restrictions: {', '.join(dietary_restrictions)}")
-        if cuisine_preference:
-            context_parts.append(f"Cuisine Preference: {cuisine_preference}")
-        if cooking_time:
-            context_parts.append(f"Maximum Cooking Time: {cooking_time} minutes")
-
-        full_context = "\n".join(context_parts)
-        prompt = self.recipe_detailed_prompt.format(context=full_context)
-
-        task = asyncio.create_task(
-            llm.agenerate([[HumanMessage(content=prompt)]])
-        )
+        full_context = self._build_context(ingredients, servings, dietary_restrictions,
+                                           cuisine_preference, cooking_time)
 
         try:
-            async for token in callback.aiter():
-                yield token
+            async for chunk in self.recipe_detailed_stream_chain.astream({"context": full_context}):
+                yield chunk.content
         except Exception as e:
             print(f"Streaming error: {e}")
-            raise
-        finally:
-            callback.done.set()
\ No newline at end of file
+            raise
\ No newline at end of file
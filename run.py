@@ -0,0 +1,15 @@
+import os
+import uvicorn
+
+if __name__ == "__main__":
+    # uvloop and httptools come with uvicorn[standard]; each worker is a
+    # separate process with its own event loop and recipe cache
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1)),
+        access_log=False,
+    )